@@ -0,0 +1,162 @@
+"""
+Streaming spending anomaly detection.
+
+Keeps constant-memory running statistics per user and category (an
+exponentially weighted mean and variance) and flags unusual spikes as new
+expense data arrives. Each update is a handful of arithmetic operations, so
+the detector can sit directly on the ingestion path. Flags are served as
+structured fields for the spending-insights prompt and the Streamlit alert
+panel.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+
+class AnomalyFlag(NamedTuple):
+    """An unusual spending observation for one category"""
+    category: str
+    amount: float
+    expected: float
+    z_score: float
+    severity: str
+    timestamp: float
+
+
+class _CategoryStats:
+    """EWMA mean and variance for one user/category stream"""
+    __slots__ = ("count", "mean", "variance")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+
+class SpendingAnomalyDetector:
+    """Flags spending spikes per user and category from running statistics"""
+
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        z_threshold: float = 3.0,
+        min_observations: int = 4,
+        min_relative_increase: float = 0.25,
+        min_abs_increase: float = 1.0,
+        min_spread: float = 1.0,
+        max_flags_per_user: int = 20,
+    ):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_observations = min_observations
+        self.min_relative_increase = min_relative_increase
+        self.min_abs_increase = min_abs_increase
+        self.min_spread = min_spread
+        self.max_flags_per_user = max_flags_per_user
+        self._stats: Dict[Tuple[str, str], _CategoryStats] = {}
+        self._flags: Dict[str, Deque[AnomalyFlag]] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self,
+        user_id: str,
+        category: str,
+        amount: float,
+        timestamp: Optional[float] = None,
+    ) -> Optional[AnomalyFlag]:
+        """Score a new amount against the category's history, then fold it in"""
+        with self._lock:
+            stats = self._stats.get((user_id, category))
+            if stats is None:
+                stats = self._stats[(user_id, category)] = _CategoryStats()
+
+            flag = None
+            if stats.count >= self.min_observations:
+                deviation = amount - stats.mean
+                # Floor the spread (relative and absolute, in currency units) so a steady or
+                # all-zero history still tolerates small changes
+                spread = max(math.sqrt(stats.variance), 0.05 * abs(stats.mean), self.min_spread)
+                z_score = deviation / spread
+                min_increase = max(self.min_relative_increase * abs(stats.mean), self.min_abs_increase)
+                if z_score >= self.z_threshold and deviation >= min_increase:
+                    flag = AnomalyFlag(
+                        category=category,
+                        amount=amount,
+                        expected=round(stats.mean, 2),
+                        z_score=round(z_score, 2),
+                        severity="high" if z_score >= 2 * self.z_threshold else "elevated",
+                        timestamp=time.time() if timestamp is None else timestamp,
+                    )
+                    flags = self._flags.get(user_id)
+                    if flags is None:
+                        flags = self._flags[user_id] = deque(maxlen=self.max_flags_per_user)
+                    flags.append(flag)
+
+            # Incremental exponentially weighted mean and variance
+            if stats.count == 0:
+                stats.mean = amount
+            else:
+                diff = amount - stats.mean
+                increment = self.alpha * diff
+                stats.mean += increment
+                stats.variance = (1 - self.alpha) * (stats.variance + diff * increment)
+            stats.count += 1
+            return flag
+
+    def observe_expenses(
+        self,
+        user_id: str,
+        expenses: Dict[str, float],
+        timestamp: Optional[float] = None,
+    ) -> List[AnomalyFlag]:
+        """Ingest a period's ``expenses`` dict and return the categories flagged"""
+        flags = []
+        for category, amount in expenses.items():
+            flag = self.observe(user_id, category, amount, timestamp)
+            if flag is not None:
+                flags.append(flag)
+        return flags
+
+    def recent_flags(self, user_id: str) -> List[AnomalyFlag]:
+        """Most recent flags for a user, newest last"""
+        with self._lock:
+            return list(self._flags.get(user_id, ()))
+
+    def category_baseline(self, user_id: str, category: str) -> Optional[Dict[str, float]]:
+        """Current running mean and standard deviation for a category"""
+        stats = self._stats.get((user_id, category))
+        if stats is None:
+            return None
+        return {
+            "observations": stats.count,
+            "mean": round(stats.mean, 2),
+            "std": round(math.sqrt(stats.variance), 2),
+        }
+
+
+def anomaly_fields(flags: List[AnomalyFlag]) -> List[Dict[str, Any]]:
+    """Structured anomaly fields for API responses and the Streamlit alert panel"""
+    return [flag._asdict() for flag in sorted(flags, key=lambda flag: flag.z_score, reverse=True)]
+
+
+def format_anomalies_for_prompt(flags: List[AnomalyFlag], currency_symbol: str = "$") -> str:
+    """Anomaly lines to include in the spending-insights prompt"""
+    if not flags:
+        return "No unusual spending detected compared to recent history."
+    lines = ["Unusual spending detected compared to recent history:"]
+    for flag in sorted(flags, key=lambda flag: flag.z_score, reverse=True):
+        lines.append(
+            f"- {flag.category}: {currency_symbol}{flag.amount:,.2f} vs typical "
+            f"{currency_symbol}{flag.expected:,.2f} ({flag.severity}, {flag.z_score:.1f} std devs above normal)"
+        )
+    return "\n".join(lines)
+
+
+@lru_cache()
+def get_anomaly_detector() -> SpendingAnomalyDetector:
+    """Shared detector instance"""
+    return SpendingAnomalyDetector()
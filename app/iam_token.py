@@ -0,0 +1,380 @@
+"""
+Cached IAM token management for IBM Watson clients.
+
+Exchanges ``NLU_KEY``/``WATSONX_KEY`` API keys for IAM bearer tokens once,
+caches them per key, and refreshes them from a background thread before they
+expire (with jitter, so workers do not refresh in lockstep). Tokens are shared
+across worker processes through a small file cache, so only one worker
+performs each exchange; the others adopt its token. The cache directory must
+be owned by the current user and not accessible to anyone else; otherwise
+the shared cache is disabled and each worker fetches its own tokens. Request handlers call
+``get_token`` which returns the cached token without waiting on IAM.
+
+For ibm-watson SDK clients use ``ManagedTokenAuthenticator``; watsonx.ai
+clients can be given ``token=get_token_manager().get_token(key)``.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import stat
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import requests
+from ibm_cloud_sdk_core.authenticators import BearerTokenAuthenticator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IAM_URL = "https://iam.cloud.ibm.com/identity/token"
+GRANT_TYPE = "urn:ibm:params:oauth:grant-type:apikey"
+
+
+def _default_cache_dir() -> str:
+    """Per-user cache directory under the system temp dir"""
+    user = str(os.getuid()) if hasattr(os, "getuid") else os.getenv("USERNAME", "user")
+    return os.path.join(tempfile.gettempdir(), f"finance-bot-iam-{user}")
+
+
+class IAMTokenError(Exception):
+    """Raised when an IAM token cannot be obtained"""
+
+
+class CachedToken(NamedTuple):
+    """An IAM access token and its lifetime (epoch seconds)"""
+    access_token: str
+    expiration: float
+    fetched_at: float
+
+
+class _KeyState:
+    """Cached token and refresh bookkeeping for one API key"""
+    __slots__ = (
+        "api_key", "key_id", "token", "refresh_at", "retry_delay", "lock",
+        "refreshes", "adopted", "failures", "blocking_fetches", "last_error",
+    )
+
+    def __init__(self, api_key: str, key_id: str):
+        self.api_key = api_key
+        self.key_id = key_id
+        self.token: Optional[CachedToken] = None
+        self.refresh_at = 0.0
+        self.retry_delay = 1.0
+        self.lock = threading.Lock()
+        self.refreshes = 0
+        self.adopted = 0
+        self.failures = 0
+        self.blocking_fetches = 0
+        self.last_error: Optional[str] = None
+
+
+class IAMTokenManager:
+    """Per-key IAM token cache with background refresh and a shared file cache"""
+
+    def __init__(
+        self,
+        iam_url: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        refresh_fraction: float = 0.8,
+        jitter_fraction: float = 0.1,
+        expiry_margin: float = 60.0,
+        request_timeout: float = 10.0,
+        lock_timeout: float = 30.0,
+    ):
+        self.iam_url = iam_url or os.getenv("IAM_URL") or DEFAULT_IAM_URL
+        self.cache_dir = cache_dir or os.getenv("IAM_TOKEN_CACHE_DIR") or _default_cache_dir()
+        self.refresh_fraction = refresh_fraction
+        self.jitter_fraction = jitter_fraction
+        self.expiry_margin = expiry_margin
+        self.request_timeout = request_timeout
+        self.lock_timeout = lock_timeout
+
+        self._keys: Dict[str, _KeyState] = {}
+        self._keys_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.shared_cache_enabled = self._prepare_cache_dir()
+
+    # Public API
+
+    def register(self, api_key: str) -> None:
+        """Track a key so its token is fetched and refreshed in the background"""
+        self._state(api_key)
+        self._wakeup.set()
+
+    def get_token(self, api_key: str) -> str:
+        """Current bearer token for a key; only blocks when no usable token exists yet"""
+        state = self._state(api_key)
+        token = state.token
+        if token is not None and time.time() < token.expiration - self.expiry_margin:
+            return token.access_token
+
+        with state.lock:
+            token = state.token
+            if token is None or time.time() >= token.expiration - self.expiry_margin:
+                if not self._adopt_shared(state):
+                    state.blocking_fetches += 1
+                    self._fetch_and_store(state)
+            self._wakeup.set()
+            return state.token.access_token
+
+    def start(self, api_keys: Iterable[str] = ()) -> None:
+        """Register keys and start the background refresh thread"""
+        for api_key in api_keys:
+            if api_key:
+                self._state(api_key)
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="iam-token-refresh", daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the background refresh thread"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def metrics(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Token age and refresh counters per key (keys identified by hash only)"""
+        now = time.time()
+        with self._keys_lock:
+            states = list(self._keys.values())
+        return {
+            state.key_id: {
+                "token_age_seconds": round(now - state.token.fetched_at, 1) if state.token else None,
+                "expires_in_seconds": round(state.token.expiration - now, 1) if state.token else None,
+                "next_refresh_in_seconds": round(state.refresh_at - now, 1) if state.token else None,
+                "refreshes": state.refreshes,
+                "adopted_from_shared_cache": state.adopted,
+                "failures": state.failures,
+                "blocking_fetches": state.blocking_fetches,
+                "last_error": state.last_error,
+            }
+            for state in states
+        }
+
+    # Background refresh
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            now = time.time()
+            with self._keys_lock:
+                states = list(self._keys.values())
+
+            for state in states:
+                if state.refresh_at <= now and state.lock.acquire(blocking=False):
+                    try:
+                        self._refresh(state)
+                    except Exception as e:
+                        # One bad key or cache file must not stop refreshes for the others
+                        logger.exception("Unexpected error refreshing IAM token for key %s", state.key_id)
+                        self._record_failure(state, e)
+                    finally:
+                        state.lock.release()
+
+            next_refresh = min((state.refresh_at for state in states), default=now + 30)
+            self._wakeup.wait(timeout=min(30.0, max(0.05, next_refresh - time.time())))
+
+    def _refresh(self, state: _KeyState) -> None:
+        """Refresh one key's token, preferring a fresh token another worker already fetched"""
+        if self._adopt_shared(state, require_fresh=True):
+            return
+
+        lock_path = self._shared_path(state.key_id) + ".lock"
+        if self.shared_cache_enabled and not self._acquire_file_lock(lock_path):
+            # Another worker is refreshing; pick up its token shortly
+            state.refresh_at = time.time() + random.uniform(0.5, 2.0)
+            return
+
+        try:
+            self._fetch_and_store(state)
+            state.refreshes += 1
+            state.retry_delay = 1.0
+        except IAMTokenError as e:
+            self._record_failure(state, e)
+            logger.warning("IAM token refresh failed for key %s: %s", state.key_id, e)
+        finally:
+            if self.shared_cache_enabled:
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+
+    # Helpers
+
+    @staticmethod
+    def _record_failure(state: _KeyState, error: Exception) -> None:
+        """Count a failed refresh and back off before the next attempt"""
+        state.failures += 1
+        state.last_error = str(error)
+        state.refresh_at = time.time() + state.retry_delay * random.uniform(1.0, 1.5)
+        state.retry_delay = min(60.0, state.retry_delay * 2)
+
+    def _state(self, api_key: str) -> _KeyState:
+        if not api_key:
+            raise IAMTokenError("No API key configured")
+        with self._keys_lock:
+            state = self._keys.get(api_key)
+            if state is None:
+                key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+                state = self._keys[api_key] = _KeyState(api_key, key_id)
+            return state
+
+    def _schedule(self, state: _KeyState) -> None:
+        """Pick the next refresh time: refresh_fraction of the lifetime, minus jitter"""
+        token = state.token
+        lifetime = max(0.0, token.expiration - token.fetched_at)
+        jitter = random.uniform(0, self.jitter_fraction * lifetime)
+        state.refresh_at = token.fetched_at + lifetime * self.refresh_fraction - jitter
+
+    def _fetch(self, api_key: str) -> CachedToken:
+        """Exchange an API key for an IAM access token"""
+        try:
+            response = requests.post(
+                self.iam_url,
+                data={"grant_type": GRANT_TYPE, "apikey": api_key},
+                headers={"Content-Type": "application/x-www-form-urlencoded", "Accept": "application/json"},
+                timeout=self.request_timeout,
+            )
+            response.raise_for_status()
+            body = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise IAMTokenError(f"IAM token request failed: {e}") from e
+
+        if "access_token" not in body:
+            raise IAMTokenError("IAM response has no access_token")
+        fetched_at = time.time()
+        expiration = body.get("expiration") or fetched_at + float(body.get("expires_in", 3600))
+        return CachedToken(body["access_token"], float(expiration), fetched_at)
+
+    def _fetch_and_store(self, state: _KeyState) -> None:
+        state.token = self._fetch(state.api_key)
+        state.last_error = None
+        self._schedule(state)
+        self._write_shared(state.key_id, state.token)
+
+    def _prepare_cache_dir(self) -> bool:
+        """Create the shared cache directory and check only the current user can use it"""
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            info = os.lstat(self.cache_dir)
+        except OSError as e:
+            logger.warning("Shared IAM token cache disabled, cannot use %s: %s", self.cache_dir, e)
+            return False
+
+        if not stat.S_ISDIR(info.st_mode):
+            problem = "not a directory"
+        elif hasattr(os, "getuid") and info.st_uid != os.getuid():
+            problem = "owned by another user"
+        elif hasattr(os, "getuid") and stat.S_IMODE(info.st_mode) & 0o077:
+            problem = f"accessible to other users (mode {stat.S_IMODE(info.st_mode):o})"
+        else:
+            return True
+        logger.warning("Shared IAM token cache disabled: %s is %s", self.cache_dir, problem)
+        return False
+
+    def _shared_path(self, key_id: str) -> str:
+        return os.path.join(self.cache_dir, f"iam-{key_id}.json")
+
+    def _read_shared(self, key_id: str) -> Optional[CachedToken]:
+        if not self.shared_cache_enabled:
+            return None
+        try:
+            with open(self._shared_path(key_id), encoding="utf-8") as handle:
+                data = json.load(handle)
+            return CachedToken(str(data["access_token"]), float(data["expiration"]), float(data["fetched_at"]))
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def _write_shared(self, key_id: str, token: CachedToken) -> None:
+        if not self.shared_cache_enabled:
+            return
+        path = self._shared_path(key_id)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, "w", encoding="utf-8") as handle:
+                json.dump(token._asdict(), handle)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning("Could not write shared IAM token cache: %s", e)
+
+    def _adopt_shared(self, state: _KeyState, require_fresh: bool = False) -> bool:
+        """Use a token from the shared cache if it is newer and still valid"""
+        shared = self._read_shared(state.key_id)
+        if shared is None or (state.token is not None and shared.fetched_at <= state.token.fetched_at):
+            return False
+        now = time.time()
+        if now >= shared.expiration - self.expiry_margin:
+            return False
+        lifetime = shared.expiration - shared.fetched_at
+        if require_fresh and now >= shared.fetched_at + lifetime * self.refresh_fraction:
+            return False
+
+        state.token = shared
+        state.adopted += 1
+        self._schedule(state)
+        return True
+
+    def _acquire_file_lock(self, lock_path: str, recreate_dir: bool = True) -> bool:
+        """Cross-process refresh lock; locks older than lock_timeout are considered stale
+
+        If the cache directory has gone (e.g. removed by a temp cleaner) it is recreated;
+        when that fails the shared cache is disabled and the caller refreshes unshared.
+        """
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > self.lock_timeout:
+                    os.remove(lock_path)
+                    return self._acquire_file_lock(lock_path, recreate_dir)
+            except OSError:
+                pass
+            return False
+        except OSError as e:
+            if recreate_dir and self._prepare_cache_dir():
+                return self._acquire_file_lock(lock_path, recreate_dir=False)
+            logger.warning("Shared IAM token cache disabled, cannot lock %s: %s", lock_path, e)
+            self.shared_cache_enabled = False
+            return True
+
+
+class ManagedTokenAuthenticator(BearerTokenAuthenticator):
+    """ibm-watson SDK authenticator that reads its bearer token from the shared manager"""
+
+    def __init__(self, api_key: str, manager: Optional[IAMTokenManager] = None):
+        self.api_key = api_key
+        self.manager = manager or get_token_manager()
+        self.manager.register(api_key)
+        super().__init__(self.manager.get_token(api_key))
+
+    def authenticate(self, req: dict) -> None:
+        self.set_bearer_token(self.manager.get_token(self.api_key))
+        super().authenticate(req)
+
+
+@lru_cache()
+def get_token_manager() -> IAMTokenManager:
+    """Shared token manager configured from the environment"""
+    return IAMTokenManager()
+
+
+def start_token_refresh() -> None:
+    """Start background refresh for the configured Watson API keys"""
+    get_token_manager().start(key for key in (os.getenv("NLU_KEY"), os.getenv("WATSONX_KEY")) if key)
+
+
+def stop_token_refresh() -> None:
+    """Stop background token refresh"""
+    get_token_manager().stop()
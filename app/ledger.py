@@ -0,0 +1,358 @@
+"""
+Incremental budget ledger.
+
+Keeps a per-user ledger of expense entries organised by household member and
+category, and maintains running totals as entries are added, edited or
+removed, so budget aggregates and financial metrics can be read without
+recomputing them from a full ``expenses`` dict. Amounts are held in integer
+cents so running totals never drift.
+
+Every change is appended to a per-user JSONL journal in ``LedgerStore`` and
+replayed on load; ``LedgerStore.compact`` rewrites a journal as a snapshot.
+The store keeps a bounded LRU cache of loaded ledgers; evicted users are
+reloaded from their journal on next access. Before each read or change the
+store replays any journal lines appended since it last looked, so several
+worker processes can share a ledger directory. A journal line that cannot
+be applied (a torn write, or a duplicate from two workers racing) is logged
+and skipped on load rather than making the whole ledger unreadable.
+"""
+
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMBER = "household"
+
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _to_cents(amount: float) -> int:
+    return int(round(float(amount) * 100))
+
+
+def _from_cents(cents: int) -> float:
+    return cents / 100
+
+
+class BudgetLedger:
+    """Running budget aggregates for one user, updated in O(1) per entry change"""
+
+    def __init__(self, income: float = 0.0, savings_goal: float = 0.0):
+        self._income = _to_cents(income)
+        self._savings_goal = _to_cents(savings_goal)
+        self._entries: Dict[str, Tuple[str, str, int]] = {}
+        self._total = 0
+        self._by_category: Dict[str, int] = {}
+        self._by_member: Dict[str, int] = {}
+        self._by_member_category: Dict[Tuple[str, str], int] = {}
+        # Lazy max-heap of (-total, category); stale items are skipped on read
+        self._category_heap: List[Tuple[int, str]] = []
+
+    def set_income(self, income: float) -> None:
+        """Set monthly income"""
+        self._income = _to_cents(income)
+
+    def set_savings_goal(self, savings_goal: float) -> None:
+        """Set monthly savings goal"""
+        self._savings_goal = _to_cents(savings_goal)
+
+    def add_entry(self, entry_id: str, category: str, amount: float, member: str = DEFAULT_MEMBER) -> None:
+        """Add an expense entry"""
+        if entry_id in self._entries:
+            raise ValueError(f"Entry '{entry_id}' already exists")
+        cents = _to_cents(amount)
+        self._entries[entry_id] = (member, category, cents)
+        self._apply(member, category, cents)
+
+    def update_entry(
+        self,
+        entry_id: str,
+        amount: Optional[float] = None,
+        category: Optional[str] = None,
+        member: Optional[str] = None,
+    ) -> None:
+        """Edit an entry's amount, category or household member"""
+        old_member, old_category, old_cents = self._entries[entry_id]
+        new_member = old_member if member is None else member
+        new_category = old_category if category is None else category
+        new_cents = old_cents if amount is None else _to_cents(amount)
+
+        self._apply(old_member, old_category, -old_cents)
+        self._entries[entry_id] = (new_member, new_category, new_cents)
+        self._apply(new_member, new_category, new_cents)
+
+    def remove_entry(self, entry_id: str) -> None:
+        """Remove an expense entry"""
+        member, category, cents = self._entries.pop(entry_id)
+        self._apply(member, category, -cents)
+
+    def _apply(self, member: str, category: str, delta: int) -> None:
+        """Apply a change in cents to every running aggregate"""
+        self._total += delta
+        self._by_category[category] = self._by_category.get(category, 0) + delta
+        self._by_member[member] = self._by_member.get(member, 0) + delta
+        self._by_member_category[(member, category)] = self._by_member_category.get((member, category), 0) + delta
+
+        heapq.heappush(self._category_heap, (-self._by_category[category], category))
+        if len(self._category_heap) > 4 * len(self._by_category) + 16:
+            self._category_heap = [(-total, name) for name, total in self._by_category.items()]
+            heapq.heapify(self._category_heap)
+
+    @property
+    def income(self) -> float:
+        return _from_cents(self._income)
+
+    @property
+    def savings_goal(self) -> float:
+        return _from_cents(self._savings_goal)
+
+    @property
+    def total_expenses(self) -> float:
+        return _from_cents(self._total)
+
+    def category_total(self, category: str) -> float:
+        """Total spent in a category across household members"""
+        return _from_cents(self._by_category.get(category, 0))
+
+    def member_total(self, member: str) -> float:
+        """Total spent by a household member"""
+        return _from_cents(self._by_member.get(member, 0))
+
+    def member_category_total(self, member: str, category: str) -> float:
+        """Total spent by a household member in a category"""
+        return _from_cents(self._by_member_category.get((member, category), 0))
+
+    def category_ratio(self, category: str) -> float:
+        """Share of monthly income spent in a category"""
+        return self._by_category.get(category, 0) / self._income if self._income else 0.0
+
+    def largest_category(self) -> Optional[Tuple[str, float]]:
+        """Highest-spend category, in amortised O(log n)"""
+        while self._category_heap:
+            negative_total, category = self._category_heap[0]
+            if self._by_category.get(category) == -negative_total and negative_total < 0:
+                return category, _from_cents(-negative_total)
+            heapq.heappop(self._category_heap)
+        return None
+
+    def budget_data(self, **extra: Any) -> Dict[str, Any]:
+        """Budget payload in the request shape, with per-category totals as ``expenses``"""
+        data = {
+            "income": self.income,
+            "expenses": {
+                category: _from_cents(total) for category, total in self._by_category.items() if total
+            },
+            "savings_goal": self.savings_goal,
+        }
+        data.update(extra)
+        return data
+
+    def metrics(self) -> Dict[str, Any]:
+        """Precomputed equivalents of ``calculate_financial_metrics`` outputs"""
+        disposable = self._income - self._total
+        return {
+            "annual_income": _from_cents(self._income * 12),
+            "total_monthly_expenses": _from_cents(self._total),
+            "disposable_income": _from_cents(disposable),
+            "surplus_after_savings": _from_cents(disposable - self._savings_goal),
+            "expense_ratio": self._total / self._income if self._income else 0.0,
+            "savings_goal_ratio": self._savings_goal / self._income if self._income else 0.0,
+        }
+
+    def apply_operation(self, operation: Dict[str, Any]) -> None:
+        """Apply one journal operation"""
+        op = operation["op"]
+        if op == "income":
+            self.set_income(operation["amount"])
+        elif op == "savings_goal":
+            self.set_savings_goal(operation["amount"])
+        elif op == "add":
+            self.add_entry(operation["id"], operation["category"], operation["amount"],
+                           operation.get("member", DEFAULT_MEMBER))
+        elif op == "update":
+            self.update_entry(operation["id"], operation.get("amount"),
+                              operation.get("category"), operation.get("member"))
+        elif op == "remove":
+            self.remove_entry(operation["id"])
+        else:
+            raise ValueError(f"Unknown ledger operation '{op}'")
+
+    def snapshot_operations(self) -> List[Dict[str, Any]]:
+        """Minimal operation list that rebuilds this ledger"""
+        operations = [
+            {"op": "income", "amount": self.income},
+            {"op": "savings_goal", "amount": self.savings_goal},
+        ]
+        for entry_id, (member, category, cents) in self._entries.items():
+            operations.append({
+                "op": "add", "id": entry_id, "category": category,
+                "amount": _from_cents(cents), "member": member,
+            })
+        return operations
+
+
+class _CachedLedger:
+    """A loaded ledger and how much of its journal has been applied"""
+    __slots__ = ("ledger", "inode", "offset")
+
+    def __init__(self, ledger: BudgetLedger, inode: Optional[int], offset: int):
+        self.ledger = ledger
+        self.inode = inode
+        self.offset = offset
+
+
+class LedgerStore:
+    """Persistent per-user ledgers backed by append-only JSONL journals"""
+
+    def __init__(self, directory: str = "data/ledgers", max_cached_users: int = 1024):
+        self.directory = directory
+        self.max_cached_users = max_cached_users
+        self._ledgers: "OrderedDict[str, _CachedLedger]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _journal_path(self, user_id: str) -> str:
+        if not USER_ID_PATTERN.match(user_id):
+            raise ValueError(f"Invalid user id '{user_id}'")
+        return os.path.join(self.directory, f"{user_id}.jsonl")
+
+    def get(self, user_id: str) -> BudgetLedger:
+        """Load (or create) a user's ledger"""
+        with self._lock:
+            return self._get(user_id)
+
+    def _get(self, user_id: str) -> BudgetLedger:
+        return self._sync(user_id).ledger
+
+    def _sync(self, user_id: str) -> _CachedLedger:
+        """Cached ledger brought up to date with lines other processes appended"""
+        path = self._journal_path(user_id)
+        try:
+            info: Optional[os.stat_result] = os.stat(path)
+        except FileNotFoundError:
+            info = None
+
+        cached = self._ledgers.get(user_id)
+        if cached is not None and info is not None and (info.st_ino != cached.inode or info.st_size < cached.offset):
+            # The journal was compacted or replaced by another process
+            cached = None
+        if cached is None:
+            cached = self._ledgers[user_id] = _CachedLedger(BudgetLedger(), info.st_ino if info else None, 0)
+        if info is not None and info.st_size > cached.offset:
+            cached.offset = self._replay(path, cached.ledger, cached.offset)
+
+        self._ledgers.move_to_end(user_id)
+        while len(self._ledgers) > self.max_cached_users:
+            self._ledgers.popitem(last=False)
+        return cached
+
+    @staticmethod
+    def _replay(path: str, ledger: BudgetLedger, offset: int) -> int:
+        """Apply complete journal lines after ``offset``; returns the new offset"""
+        with open(path, "rb") as handle:
+            handle.seek(offset)
+            data = handle.read()
+        # A trailing line without a newline is still being written (or was torn)
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                ledger.apply_operation(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning("Skipping unusable operation in ledger journal %s: %s", path, e)
+        return offset + end
+
+    def apply(self, user_id: str, operation: Dict[str, Any]) -> BudgetLedger:
+        """Apply an operation to a user's ledger and append it to the journal
+
+        The operation is validated against the in-memory ledger first. A failed append
+        is truncated away and the cached ledger dropped so it reloads from disk; an
+        append always starts on a new line, even after a torn write that could not
+        be truncated.
+        """
+        with self._lock:
+            cached = self._sync(user_id)
+            cached.ledger.apply_operation(operation)
+            line = (json.dumps(operation, separators=(",", ":")) + "\n").encode("utf-8")
+            try:
+                # Unbuffered, so a failed write leaves nothing behind to flush on close
+                with open(self._journal_path(user_id), "a+b", buffering=0) as handle:
+                    start = handle.seek(0, os.SEEK_END)
+                    if start:
+                        handle.seek(start - 1)
+                        if handle.read(1) != b"\n":
+                            line = b"\n" + line
+                    try:
+                        if handle.write(line) != len(line):
+                            raise OSError(f"Short write to ledger journal for '{user_id}'")
+                    except OSError:
+                        handle.truncate(start)
+                        raise
+                    inode = os.fstat(handle.fileno()).st_ino
+            except OSError:
+                self._ledgers.pop(user_id, None)
+                raise
+
+            if start == cached.offset and cached.inode in (None, inode):
+                cached.inode = inode
+                cached.offset = start + len(line)
+            else:
+                # Another process wrote in between; reload from the journal on next access
+                self._ledgers.pop(user_id, None)
+            return cached.ledger
+
+    def set_income(self, user_id: str, income: float) -> BudgetLedger:
+        return self.apply(user_id, {"op": "income", "amount": income})
+
+    def set_savings_goal(self, user_id: str, savings_goal: float) -> BudgetLedger:
+        return self.apply(user_id, {"op": "savings_goal", "amount": savings_goal})
+
+    def add_entry(self, user_id: str, entry_id: str, category: str, amount: float,
+                  member: str = DEFAULT_MEMBER) -> BudgetLedger:
+        return self.apply(user_id, {
+            "op": "add", "id": entry_id, "category": category, "amount": amount, "member": member,
+        })
+
+    def update_entry(self, user_id: str, entry_id: str, amount: Optional[float] = None,
+                     category: Optional[str] = None, member: Optional[str] = None) -> BudgetLedger:
+        operation: Dict[str, Any] = {"op": "update", "id": entry_id}
+        if amount is not None:
+            operation["amount"] = amount
+        if category is not None:
+            operation["category"] = category
+        if member is not None:
+            operation["member"] = member
+        return self.apply(user_id, operation)
+
+    def remove_entry(self, user_id: str, entry_id: str) -> BudgetLedger:
+        return self.apply(user_id, {"op": "remove", "id": entry_id})
+
+    def compact(self, user_id: str) -> None:
+        """Rewrite a user's journal as a snapshot of the current ledger"""
+        with self._lock:
+            ledger = self._get(user_id)
+            path = self._journal_path(user_id)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as handle:
+                for operation in ledger.snapshot_operations():
+                    handle.write(json.dumps(operation, separators=(",", ":")) + "\n")
+            os.replace(temp_path, path)
+            self._ledgers.pop(user_id, None)
+
+
+@lru_cache()
+def get_ledger_store() -> LedgerStore:
+    """Shared ledger store configured from the environment"""
+    return LedgerStore(
+        os.getenv("LEDGER_DIR", "data/ledgers"),
+        max_cached_users=int(os.getenv("LEDGER_CACHE_SIZE", 1024))
+    )
@@ -0,0 +1,183 @@
+"""
+Latency-aware model routing for watsonx.ai.
+
+Picks a model tier and a ``max_new_tokens`` budget for each request from
+cheap request features (question length, NLU keywords, persona, endpoint).
+Observed upstream latency is fed back per route; when a route runs over its
+latency SLO its output budget is tightened, and relaxed again once it recovers.
+
+Typical use when invoking the LLM:
+
+    router = get_model_router()
+    decision = router.route("generate", question, persona, keywords)
+    start = time.perf_counter()
+    ... generate with decision.model_id and decision.max_new_tokens ...
+    router.record_latency("generate", (time.perf_counter() - start) * 1000)
+"""
+
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional
+
+SMALL_TIER = "small"
+LARGE_TIER = "large"
+
+# Output budgets per endpoint and tier (max_new_tokens)
+TOKEN_BUDGETS = {
+    "generate": {SMALL_TIER: 300, LARGE_TIER: 600},
+    "budget-summary": {SMALL_TIER: 500, LARGE_TIER: 900},
+    "spending-insights": {SMALL_TIER: 600, LARGE_TIER: 1000},
+}
+DEFAULT_TOKEN_BUDGET = {SMALL_TIER: 300, LARGE_TIER: 600}
+
+# Upstream latency SLOs per endpoint in milliseconds
+ROUTE_SLOS_MS = {
+    "generate": 4000.0,
+    "budget-summary": 8000.0,
+    "spending-insights": 10000.0,
+}
+DEFAULT_SLO_MS = 6000.0
+
+# Endpoints that always need the larger model for multi-part structured analysis
+LARGE_ONLY_ENDPOINTS = {"budget-summary", "spending-insights"}
+
+# Topics that call for deeper reasoning than definitions and simple tips
+COMPLEX_TOPICS = {
+    "tax", "taxes", "invest", "investment", "investments", "portfolio", "retirement",
+    "mortgage", "refinance", "loan", "loans", "debt", "401k", "ira", "roth", "stocks",
+    "bonds", "capital", "gains", "insurance", "estate", "inflation", "compare",
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Budget scale controller settings; decisions use the latency EWMA, not single samples
+LATENCY_EWMA_WEIGHT = 0.2
+LATENCY_SAMPLE_CAP = 2.0  # samples are capped at this multiple of the SLO before averaging
+MIN_LATENCY_SAMPLES = 5
+MIN_BUDGET_SCALE = 0.4
+TIGHTEN_FACTOR = 0.85
+RELAX_FACTOR = 1.05
+RELAX_THRESHOLD = 0.8
+MIN_TOKENS = 64
+
+
+class RoutingDecision(NamedTuple):
+    """Model choice and output budget for one LLM call"""
+    tier: str
+    model_id: str
+    max_new_tokens: int
+    reason: str
+
+
+class ModelRouter:
+    """Routes LLM requests between a small fast model and the 8B model"""
+
+    def __init__(
+        self,
+        small_model_id: Optional[str] = None,
+        large_model_id: Optional[str] = None,
+        slos_ms: Optional[Dict[str, float]] = None,
+    ):
+        self.models = {
+            SMALL_TIER: small_model_id or os.getenv("WATSONX_SMALL_MODEL_ID", "ibm/granite-3-2b-instruct"),
+            LARGE_TIER: large_model_id or os.getenv("WATSONX_MODEL_ID", "ibm/granite-3-2-8b-instruct"),
+        }
+        self.slos_ms = dict(ROUTE_SLOS_MS if slos_ms is None else slos_ms)
+        self._budget_scale: Dict[str, float] = {}
+        self._latency_ewma: Dict[str, float] = {}
+        self._latency_samples: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def complexity_score(
+        self,
+        question: str,
+        persona: str = "general",
+        keywords: Optional[List[str]] = None,
+    ) -> float:
+        """Score how demanding a question is from cheap text features"""
+        words = WORD_PATTERN.findall(question.lower())
+        terms = set(words)
+        for keyword in keywords or []:
+            terms.update(WORD_PATTERN.findall(str(keyword).lower()))
+
+        score = len(words) / 25
+        score += 0.75 * len(terms & COMPLEX_TOPICS)
+        score += 0.5 * max(0, question.count("?") - 1)
+        if persona == "professional":
+            score += 0.5
+        return score
+
+    def route(
+        self,
+        endpoint: str,
+        question: str = "",
+        persona: str = "general",
+        keywords: Optional[List[str]] = None,
+    ) -> RoutingDecision:
+        """Choose the model tier and max_new_tokens for a request"""
+        if endpoint in LARGE_ONLY_ENDPOINTS:
+            tier, reason = LARGE_TIER, "structured analysis endpoint"
+        else:
+            score = self.complexity_score(question, persona, keywords)
+            if score < 1.0:
+                tier, reason = SMALL_TIER, f"simple question (score {score:.2f})"
+            else:
+                tier, reason = LARGE_TIER, f"complex question (score {score:.2f})"
+
+        base_tokens = TOKEN_BUDGETS.get(endpoint, DEFAULT_TOKEN_BUDGET)[tier]
+        scale = self.budget_scale(endpoint)
+        max_new_tokens = max(MIN_TOKENS, int(base_tokens * scale))
+        if scale < 1.0:
+            reason += f", budget tightened to {scale:.0%} for latency SLO"
+
+        return RoutingDecision(tier, self.models[tier], max_new_tokens, reason)
+
+    def record_latency(self, endpoint: str, latency_ms: float) -> None:
+        """Feed back an observed upstream latency and adjust the route's output budget
+
+        The budget follows the route's latency EWMA, so it tightens while latency stays
+        above the SLO rather than on a single slow sample. Samples are capped so one
+        extreme outlier cannot push the average over the SLO by itself.
+        """
+        slo_ms = self.slos_ms.get(endpoint, DEFAULT_SLO_MS)
+        sample_ms = min(latency_ms, LATENCY_SAMPLE_CAP * slo_ms)
+        with self._lock:
+            previous = self._latency_ewma.get(endpoint)
+            ewma = sample_ms if previous is None else (
+                (1 - LATENCY_EWMA_WEIGHT) * previous + LATENCY_EWMA_WEIGHT * sample_ms
+            )
+            self._latency_ewma[endpoint] = ewma
+            samples = self._latency_samples[endpoint] = self._latency_samples.get(endpoint, 0) + 1
+            if samples < MIN_LATENCY_SAMPLES:
+                return
+
+            scale = self._budget_scale.get(endpoint, 1.0)
+            if ewma > slo_ms:
+                scale = max(MIN_BUDGET_SCALE, scale * TIGHTEN_FACTOR)
+            elif ewma < RELAX_THRESHOLD * slo_ms:
+                scale = min(1.0, scale * RELAX_FACTOR)
+            self._budget_scale[endpoint] = scale
+
+    def budget_scale(self, endpoint: str) -> float:
+        """Current output budget multiplier for a route (1.0 = untightened)"""
+        return self._budget_scale.get(endpoint, 1.0)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Observed latency and budget scale per route"""
+        with self._lock:
+            return {
+                endpoint: {
+                    "latency_ewma_ms": round(latency, 1),
+                    "slo_ms": self.slos_ms.get(endpoint, DEFAULT_SLO_MS),
+                    "budget_scale": round(self._budget_scale.get(endpoint, 1.0), 3),
+                }
+                for endpoint, latency in self._latency_ewma.items()
+            }
+
+
+@lru_cache()
+def get_model_router() -> ModelRouter:
+    """Shared router instance configured from the environment"""
+    return ModelRouter()
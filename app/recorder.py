@@ -0,0 +1,213 @@
+"""
+Request recorder middleware.
+
+Captures sanitized ``/api/v1/*`` request payloads together with their timing
+and appends them to a rotating, gzip-compressed JSONL log. The log rotates
+once its compressed size on disk reaches ``max_bytes``. Each worker process
+writes and rotates its own log file (named by pid), so several uvicorn
+workers can share one log directory. Records are handed to a background
+writer thread so the request path never waits on disk I/O. The resulting
+log can be played back with ``replay.py``.
+"""
+
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+# Active logs are per process; rotated logs sort by rotation time across processes
+ACTIVE_LOG_TEMPLATE = "requests.{pid}.jsonl.gz"
+ROTATED_LOG_TEMPLATE = "requests-{stamp}-{pid}.jsonl.gz"
+
+# Keys whose values are never written to disk
+SENSITIVE_KEYS = {
+    "api_key", "apikey", "password", "token", "access_token", "secret",
+    "authorization", "email", "phone", "account_number", "card_number", "ssn",
+}
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+LONG_NUMBER_PATTERN = re.compile(r"\b\d(?:[ -]?\d){8,}\b")
+
+
+def sanitize_payload(value: Any) -> Any:
+    """Redact sensitive keys, e-mail addresses and long digit runs from a payload"""
+    if isinstance(value, dict):
+        return {
+            key: "[REDACTED]" if str(key).lower() in SENSITIVE_KEYS else sanitize_payload(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [sanitize_payload(item) for item in value]
+    if isinstance(value, str):
+        value = EMAIL_PATTERN.sub("[EMAIL]", value)
+        return LONG_NUMBER_PATTERN.sub("[NUMBER]", value)
+    return value
+
+
+class RequestRecorder:
+    """Background writer for the rotating, compressed request log"""
+
+    def __init__(
+        self,
+        log_dir: str = "logs",
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 10,
+        queue_size: int = 10000,
+    ):
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+
+        os.makedirs(log_dir, exist_ok=True)
+        self.active_path = os.path.join(log_dir, ACTIVE_LOG_TEMPLATE.format(pid=os.getpid()))
+
+        self._thread = threading.Thread(target=self._run, name="request-recorder", daemon=True)
+        self._thread.start()
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        """Queue a record for writing; drops it rather than block when the queue is full"""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush pending records and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        """Drain the queue in batches, writing each batch as one gzip member"""
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            item = self._queue.get()
+            while True:
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """Append a batch of records and rotate the log if it grew too large"""
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in batch)
+        try:
+            with gzip.open(self.active_path, "ab") as handle:
+                handle.write(data.encode("utf-8"))
+            # max_bytes limits the compressed size on disk, which also holds across restarts
+            if os.path.getsize(self.active_path) >= self.max_bytes:
+                self._rotate()
+        except OSError:
+            self.dropped += len(batch)
+
+    def _rotate(self) -> None:
+        """Move the active log aside and prune old rotated logs (``backup_count`` across all workers)"""
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        rotated_name = ROTATED_LOG_TEMPLATE.format(stamp=stamp, pid=os.getpid())
+        os.replace(self.active_path, os.path.join(self.log_dir, rotated_name))
+
+        rotated = sorted(
+            name for name in os.listdir(self.log_dir)
+            if name.startswith("requests-") and name.endswith(".jsonl.gz")
+        )
+        for name in rotated[:max(0, len(rotated) - self.backup_count)]:
+            try:
+                os.remove(os.path.join(self.log_dir, name))
+            except FileNotFoundError:
+                # Another worker pruned it first
+                continue
+
+
+class RequestRecorderMiddleware:
+    """ASGI middleware that records API requests without delaying responses"""
+
+    def __init__(self, app, recorder: RequestRecorder, path_prefix: str = "/api/v1/"):
+        self.app = app
+        self.recorder = recorder
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        body = bytearray()
+        status = {"code": 500}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.extend(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.recorder.submit(self._build_record(scope, bytes(body), status["code"], started, duration_ms))
+
+    @staticmethod
+    def _build_record(scope, body: bytes, status_code: int, started: float, duration_ms: float) -> Dict[str, Any]:
+        """Build the log record for a finished request"""
+        try:
+            payload = sanitize_payload(json.loads(body)) if body else None
+        except (ValueError, UnicodeDecodeError):
+            payload = None
+
+        return {
+            "ts": started,
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "status": status_code,
+            "duration_ms": round(duration_ms, 3),
+            "body_bytes": len(body),
+            "payload": payload,
+        }
+
+
+def iter_log_files(path: str) -> List[str]:
+    """List log files for a path, oldest first; the workers' active logs come last"""
+    if not os.path.isdir(path):
+        return [path]
+
+    names = sorted(name for name in os.listdir(path) if name.endswith(".jsonl.gz"))
+    rotated = [name for name in names if name.startswith("requests-")]
+    active = [name for name in names if name.startswith("requests.")]
+    return [os.path.join(path, name) for name in rotated + active]
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield recorded requests from a log file or log directory"""
+    for file_path in iter_log_files(path):
+        opener = gzip.open if file_path.endswith(".gz") else open
+        with opener(file_path, "rt", encoding="utf-8") as handle:
+            try:
+                for line in handle:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+            except EOFError:
+                # A writer may still be appending to the active log
+                continue
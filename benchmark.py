@@ -0,0 +1,398 @@
+"""
+Performance regression benchmarks.
+
+Microbenchmarks for ``app.utils`` (financial metrics and prompt builders) and
+``app.models`` validation, plus endpoint benchmarks through the full route
+stack with IBM Watson mocked. Payloads range from small to very large expense
+and goal lists. Each run is stored as JSON with machine metadata under
+``.benchmarks/`` and runs can be compared for statistically significant
+regressions.
+
+Usage:
+    python benchmark.py run
+    python benchmark.py run --filter utils --repeat 30
+    python benchmark.py compare                      # latest run vs the one before
+    python benchmark.py compare .benchmarks/a.json .benchmarks/b.json
+"""
+
+import argparse
+import glob
+import inspect
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from replay import mock_watson
+
+HISTORY_DIR = os.getenv("BENCHMARK_HISTORY_DIR", ".benchmarks")
+
+# Number of expense categories and goals per payload size
+PAYLOAD_SIZES = {
+    "small": (5, 1),
+    "medium": (25, 5),
+    "large": (200, 25),
+    "xlarge": (2000, 200),
+}
+
+CATEGORY_NAMES = [
+    "rent", "food", "groceries", "dining_out", "transportation", "utilities",
+    "entertainment", "shopping", "insurance", "healthcare", "education", "subscriptions",
+]
+
+# Number of words in generated free-text payloads per size
+TEXT_SIZES = {
+    "small": 10,
+    "medium": 60,
+    "large": 400,
+    "xlarge": 4000,
+}
+
+QUESTIONS = [
+    "What is an emergency fund?",
+    "How can I save while repaying student loans?",
+    "Should I invest in index funds or pay down my credit card debt first, "
+    "and how should I think about taxes on my investments over the next ten years?",
+]
+
+
+def make_budget_payload(size: str, persona: str = "student", seed: int = 0) -> Dict[str, Any]:
+    """Generate a realistic budget payload with the given number of categories and goals"""
+    num_expenses, num_goals = PAYLOAD_SIZES[size]
+    rng = random.Random(f"{size}-{seed}")
+
+    expenses = {}
+    for i in range(num_expenses):
+        name = CATEGORY_NAMES[i % len(CATEGORY_NAMES)]
+        if i >= len(CATEGORY_NAMES):
+            name = f"{name}_{i // len(CATEGORY_NAMES)}"
+        expenses[name] = round(rng.lognormvariate(5, 1), 2)
+
+    total_expenses = sum(expenses.values())
+    return {
+        "income": round(total_expenses * rng.uniform(1.1, 1.6), 2),
+        "expenses": expenses,
+        "savings_goal": round(total_expenses * rng.uniform(0.05, 0.2), 2),
+        "goals": [
+            {
+                "name": f"Goal {i + 1}",
+                "amount": round(rng.uniform(500, 50000), 2),
+                "deadline_months": rng.randint(3, 60),
+            }
+            for i in range(num_goals)
+        ],
+        "currency_symbol": "$",
+        "persona": persona,
+    }
+
+
+def make_text_payload(size: str, persona: str = "student", seed: int = 0) -> Dict[str, Any]:
+    """Generate free-text payloads (NLU ``text`` and Q&A ``question``) of the given length"""
+    rng = random.Random(f"text-{size}-{seed}")
+    vocabulary = " ".join(QUESTIONS).replace("?", "").replace(",", "").split()
+    text = " ".join(rng.choice(vocabulary) for _ in range(TEXT_SIZES[size])) + "?"
+    return {
+        "text": text,
+        "question": text,
+        "persona": persona,
+    }
+
+
+# Payload generators tried, in order, for each app.models request model
+MODEL_PAYLOAD_GENERATORS = [make_budget_payload, make_text_payload]
+
+
+def _timeit(func: Callable[[], Any], repeat: int, min_sample_seconds: float) -> List[float]:
+    """Time a callable, returning per-call microseconds for each sample"""
+    func()  # warm up
+
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_sample_seconds or loops >= 1_000_000:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_sample_seconds / elapsed) + 1))
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops * 1e6)
+    return samples
+
+
+def _model_classes() -> List[type]:
+    """Pydantic request models defined in app.models"""
+    from pydantic import BaseModel
+    from app import models
+
+    return [
+        cls for _, cls in inspect.getmembers(models, inspect.isclass)
+        if issubclass(cls, BaseModel) and cls is not BaseModel and cls.__module__ == models.__name__
+    ]
+
+
+def _required_fields(cls: type) -> set:
+    """Required field names for a pydantic v1 or v2 model"""
+    if hasattr(cls, "model_fields"):
+        return {name for name, field in cls.model_fields.items() if field.is_required()}
+    return {name for name, field in cls.__fields__.items() if field.required}
+
+
+def _declared_fields(cls: type) -> set:
+    """All field names for a pydantic v1 or v2 model"""
+    return set(cls.model_fields if hasattr(cls, "model_fields") else cls.__fields__)
+
+
+def _model_payload(cls: type, size: str) -> Optional[Dict[str, Any]]:
+    """Generated payload for a model: the generator covering its required fields and most of its fields"""
+    required, declared = _required_fields(cls), _declared_fields(cls)
+    candidates = [generator(size) for generator in MODEL_PAYLOAD_GENERATORS]
+    candidates = [payload for payload in candidates if required <= set(payload)]
+    if not candidates:
+        return None
+    payload = max(candidates, key=lambda payload: len(declared & set(payload)))
+    return {name: value for name, value in payload.items() if name in declared}
+
+
+def collect_benchmarks(name_filter: str = "") -> Dict[str, Callable[[], Any]]:
+    """Build the benchmark table: name -> zero-argument callable"""
+    from app import utils
+
+    benchmarks: Dict[str, Callable[[], Any]] = {}
+
+    for size in PAYLOAD_SIZES:
+        payload = make_budget_payload(size, persona="professional")
+        benchmarks[f"utils.calculate_financial_metrics[{size}]"] = (
+            lambda payload=payload: utils.calculate_financial_metrics(payload)
+        )
+        benchmarks[f"utils.build_budget_prompt[{size}]"] = (
+            lambda payload=payload: utils.build_budget_prompt(payload)
+        )
+
+    for i, question in enumerate(QUESTIONS):
+        benchmarks[f"utils.build_simple_prompt[q{i}]"] = (
+            lambda question=question: utils.build_simple_prompt(question, "student")
+        )
+
+    for cls in _model_classes():
+        for size in PAYLOAD_SIZES:
+            payload = _model_payload(cls, size)
+            if payload is None:
+                print(f"Warning: no payload generator covers the fields of models.{cls.__name__}", file=sys.stderr)
+                break
+            benchmarks[f"models.{cls.__name__}[{size}]"] = lambda cls=cls, payload=payload: cls(**payload)
+
+    for i, question in enumerate(QUESTIONS[:2]):
+        benchmarks[f"route.generate[q{i}]"] = _endpoint_call("generate", {"question": question, "persona": "student"})
+    for size in PAYLOAD_SIZES:
+        payload = make_budget_payload(size)
+        benchmarks[f"route.budget-summary[{size}]"] = _endpoint_call("budget-summary", payload)
+        benchmarks[f"route.spending-insights[{size}]"] = _endpoint_call("spending-insights", payload)
+
+    return {name: func for name, func in benchmarks.items() if name_filter in name}
+
+
+def _endpoint_call(endpoint: str, payload: Dict[str, Any]) -> Callable[[], Any]:
+    """Callable posting a payload through the full FastAPI stack"""
+    clients = []
+
+    def call():
+        if not clients:
+            from fastapi.testclient import TestClient
+            from main import app
+            clients.append(TestClient(app))
+        response = clients[0].post(f"/api/v1/{endpoint}", json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"{endpoint} returned {response.status_code}: {response.text[:200]}")
+        return response
+
+    return call
+
+
+def machine_metadata() -> Dict[str, Any]:
+    """Describe the machine and checkout a run was taken on"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "node": platform.node(),
+        "git_commit": commit,
+    }
+
+
+def run_benchmarks(name_filter: str = "", repeat: int = 20, min_sample_seconds: float = 0.01) -> Dict[str, Any]:
+    """Run all benchmarks (Watson mocked) and return a result document"""
+    results = {}
+    with mock_watson():
+        for name, func in collect_benchmarks(name_filter).items():
+            samples = _timeit(func, repeat, min_sample_seconds)
+            results[name] = {
+                "samples_us": [round(sample, 4) for sample in samples],
+                "median_us": round(statistics.median(samples), 4),
+                "mean_us": round(statistics.mean(samples), 4),
+                "stdev_us": round(statistics.stdev(samples), 4) if len(samples) > 1 else 0.0,
+            }
+            print(f"{name:<60}{results[name]['median_us']:>14.2f} us")
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "machine": machine_metadata(),
+        "benchmarks": results,
+    }
+
+
+def save_run(run: Dict[str, Any], history_dir: str = HISTORY_DIR) -> str:
+    """Store a run in the benchmark history and return its path"""
+    os.makedirs(history_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    commit = run["machine"].get("git_commit") or "nocommit"
+    path = os.path.join(history_dir, f"{stamp}-{commit}.json")
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(run, handle, indent=2)
+    return path
+
+
+def mann_whitney_u(baseline: List[float], candidate: List[float]) -> float:
+    """Two-sided Mann-Whitney U test p-value (normal approximation with tie correction)"""
+    n1, n2 = len(baseline), len(candidate)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+
+    combined = sorted([(value, 0) for value in baseline] + [(value, 1) for value in candidate])
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        tied = j - i + 1
+        tie_term += tied ** 3 - tied
+        i = j + 1
+
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return max(0.0, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2))))
+
+
+def compare_runs(
+    baseline: Dict[str, Any],
+    candidate: Dict[str, Any],
+    alpha: float = 0.01,
+    threshold: float = 0.05,
+) -> List[Dict[str, Any]]:
+    """Compare two runs; a change is significant when p < alpha and medians differ by > threshold"""
+    rows = []
+    for name, current in candidate["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None:
+            continue
+        change = current["median_us"] / previous["median_us"] - 1 if previous["median_us"] else 0.0
+        p_value = mann_whitney_u(previous["samples_us"], current["samples_us"])
+        significant = p_value < alpha and abs(change) > threshold
+        rows.append({
+            "name": name,
+            "baseline_us": previous["median_us"],
+            "candidate_us": current["median_us"],
+            "change": change,
+            "p_value": p_value,
+            "status": ("regression" if change > 0 else "improvement") if significant else "unchanged",
+        })
+    return rows
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _latest_runs(history_dir: str) -> Tuple[Optional[str], Optional[str]]:
+    """Paths of the two most recent runs in the history"""
+    runs = sorted(glob.glob(os.path.join(history_dir, "*.json")))
+    if len(runs) < 2:
+        return None, None
+    return runs[-2], runs[-1]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Performance regression benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run benchmarks and store the results")
+    run_parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    run_parser.add_argument("--repeat", type=int, default=20, help="Samples per benchmark")
+    run_parser.add_argument("--min-sample-seconds", type=float, default=0.01,
+                            help="Minimum duration of each timed sample")
+    run_parser.add_argument("--history-dir", default=HISTORY_DIR)
+
+    compare_parser = subparsers.add_parser("compare", help="Flag significant regressions between two runs")
+    compare_parser.add_argument("baseline", nargs="?", help="Baseline run (default: second latest)")
+    compare_parser.add_argument("candidate", nargs="?", help="Candidate run (default: latest)")
+    compare_parser.add_argument("--alpha", type=float, default=0.01, help="Significance level")
+    compare_parser.add_argument("--threshold", type=float, default=0.05,
+                                help="Minimum relative change of the median to report")
+    compare_parser.add_argument("--history-dir", default=HISTORY_DIR)
+
+    args = parser.parse_args(argv)
+
+    # Never record benchmark traffic; main.py reads this when it is first imported
+    os.environ["REQUEST_LOG_ENABLED"] = "false"
+
+    if args.command == "run":
+        run = run_benchmarks(args.filter, args.repeat, args.min_sample_seconds)
+        print(f"Saved results to {save_run(run, args.history_dir)}")
+        return 0
+
+    baseline_path, candidate_path = args.baseline, args.candidate
+    if not (baseline_path and candidate_path):
+        baseline_path, candidate_path = _latest_runs(args.history_dir)
+    if not (baseline_path and candidate_path):
+        print("Need two benchmark runs to compare", file=sys.stderr)
+        return 2
+
+    baseline, candidate = _load(baseline_path), _load(candidate_path)
+    if baseline["machine"].get("node") != candidate["machine"].get("node"):
+        print("Warning: runs were taken on different machines", file=sys.stderr)
+
+    rows = compare_runs(baseline, candidate, args.alpha, args.threshold)
+    print(f"{'benchmark':<60}{'baseline':>12}{'candidate':>12}{'change':>9}{'p':>9}  status")
+    for row in rows:
+        print(f"{row['name']:<60}{row['baseline_us']:>12.2f}{row['candidate_us']:>12.2f}"
+              f"{row['change']:>+9.1%}{row['p_value']:>9.4f}  {row['status']}")
+
+    regressions = [row for row in rows if row["status"] == "regression"]
+    print(f"{len(regressions)} significant regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,8 @@ from dotenv import load_dotenv
 import os
 
 from app.routes import router
+from app.recorder import RequestRecorder, RequestRecorderMiddleware
+from app.iam_token import start_token_refresh, stop_token_refresh
 
 # Load environment variables
 load_dotenv()
@@ -26,6 +28,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record sanitized API traffic for replay benchmarking (see replay.py)
+if os.getenv("REQUEST_LOG_ENABLED", "false").lower() == "true":
+    request_recorder = RequestRecorder(
+        log_dir=os.getenv("REQUEST_LOG_DIR", "logs"),
+        max_bytes=int(os.getenv("REQUEST_LOG_MAX_BYTES", 10 * 1024 * 1024)),
+        backup_count=int(os.getenv("REQUEST_LOG_BACKUP_COUNT", 10))
+    )
+    app.add_middleware(RequestRecorderMiddleware, recorder=request_recorder)
+    app.add_event_handler("shutdown", request_recorder.close)
+
+# Keep Watson IAM tokens cached and refreshed off the request path
+if os.getenv("IAM_TOKEN_REFRESH_ENABLED", "false").lower() == "true":
+    app.add_event_handler("startup", start_token_refresh)
+    app.add_event_handler("shutdown", stop_token_refresh)
+
 # Include API routes
 app.include_router(router, prefix="/api/v1")
 
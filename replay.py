@@ -0,0 +1,218 @@
+"""
+Replay captured API traffic against the FastAPI app.
+
+Plays back a request log written by ``app.recorder`` at its original pacing
+(or accelerated with ``--speed``) with the IBM Watson calls mocked, and
+reports client-side latency distributions per route.
+
+Usage:
+    python replay.py logs/ --speed 10
+    python replay.py logs/requests.12345.jsonl.gz --speed 0 --mock-latency-ms 50 --output report.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+import httpx
+
+from app.recorder import read_records
+
+
+def _mock_nlu(*args, **kwargs):
+    return {
+        "sentiment": {"document": {"label": "neutral", "score": 0.0}},
+        "keywords": ["money", "savings"],
+        "entities": []
+    }
+
+
+def _mock_llm(*args, **kwargs):
+    return "Here are some tips for managing your money..."
+
+
+def _mock_generation(*args, **kwargs):
+    return {
+        "response": "Mocked financial analysis...",
+        "prompt": "Mocked prompt...",
+        "error": None
+    }
+
+
+WATSON_MOCKS = {
+    "app.ibm_api.analyze_nlu": _mock_nlu,
+    "app.ibm_api.invoke_llm": _mock_llm,
+    "app.ibm_api.generate_budget_summary": _mock_generation,
+    "app.ibm_api.generate_spending_insights": _mock_generation,
+}
+
+
+@contextmanager
+def mock_watson(latency_ms: float = 0.0):
+    """Patch the IBM Watson calls with canned responses and optional fixed latency"""
+
+    def delayed(func):
+        def wrapper(*args, **kwargs):
+            if latency_ms > 0:
+                time.sleep(latency_ms / 1000)
+            return func(*args, **kwargs)
+        return wrapper
+
+    with ExitStack() as stack:
+        for target, func in WATSON_MOCKS.items():
+            stack.enter_context(patch(target, side_effect=delayed(func)))
+        yield
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def summarize_latencies(values: List[float]) -> Dict[str, float]:
+    """Summarize a list of latencies (ms) as a distribution"""
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "min": round(ordered[0], 3),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": round(percentile(ordered, 50), 3),
+        "p90": round(percentile(ordered, 90), 3),
+        "p95": round(percentile(ordered, 95), 3),
+        "p99": round(percentile(ordered, 99), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+async def replay(records: List[Dict[str, Any]], speed: float = 1.0, concurrency: int = 100) -> Dict[str, Any]:
+    """Send recorded requests to the app and collect per-route latencies"""
+    from main import app
+
+    records = sorted(records, key=lambda record: record.get("ts", 0))
+    first_ts = records[0].get("ts", 0) if records else 0
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Dict[str, Any]] = []
+
+    # Unhandled app exceptions come back as 500 responses and count as errors
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+
+        async def send(record: Dict[str, Any]) -> None:
+            url = record["path"] + (f"?{record['query']}" if record.get("query") else "")
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.request(record["method"], url, json=record.get("payload"))
+                    status: Optional[int] = response.status_code
+                except httpx.HTTPError:
+                    status = None
+                latency_ms = (time.perf_counter() - start) * 1000
+            results.append({
+                "path": record["path"],
+                "status": status,
+                "recorded_status": record.get("status"),
+                "latency_ms": latency_ms,
+                "recorded_ms": record.get("duration_ms"),
+            })
+
+        tasks = []
+        start = time.perf_counter()
+        for record in records:
+            if speed > 0:
+                delay = (record.get("ts", first_ts) - first_ts) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(record)))
+        await asyncio.gather(*tasks)
+        wall_seconds = time.perf_counter() - start
+
+    return build_report(results, wall_seconds)
+
+
+def build_report(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Group replay results by route into latency distributions"""
+    routes: Dict[str, Dict[str, Any]] = {}
+    for path in sorted({result["path"] for result in results}):
+        route_results = [result for result in results if result["path"] == path]
+        routes[path] = {
+            "latency_ms": summarize_latencies([result["latency_ms"] for result in route_results]),
+            "recorded_ms": summarize_latencies(
+                [result["recorded_ms"] for result in route_results if result["recorded_ms"] is not None]
+            ),
+            "errors": sum(1 for result in route_results if result["status"] is None or result["status"] >= 500),
+            "status_mismatches": sum(
+                1 for result in route_results
+                if result["recorded_status"] is not None and result["status"] != result["recorded_status"]
+            ),
+        }
+
+    return {
+        "requests": len(results),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(results) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "overall_latency_ms": summarize_latencies([result["latency_ms"] for result in results]),
+        "routes": routes,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print a replay report as a table"""
+    print(f"Replayed {report['requests']} requests in {report['wall_seconds']}s "
+          f"({report['throughput_rps']} req/s)")
+    print(f"{'route':<32}{'count':>7}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}{'errors':>8}")
+    for path, stats in report["routes"].items():
+        latency = stats["latency_ms"]
+        print(f"{path:<32}{latency['count']:>7}{latency['p50']:>10}{latency['p90']:>10}"
+              f"{latency['p99']:>10}{latency['max']:>10}{stats['errors']:>8}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured API traffic with IBM Watson mocked")
+    parser.add_argument("log", help="Request log file or log directory")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Pacing multiplier; 1 = original pacing, 0 = as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=100, help="Maximum in-flight requests")
+    parser.add_argument("--mock-latency-ms", type=float, default=0.0,
+                        help="Simulated latency for each mocked Watson call")
+    parser.add_argument("--limit", type=int, default=0, help="Replay at most this many requests")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    # Never record replayed traffic; main.py reads this when it is first imported
+    os.environ["REQUEST_LOG_ENABLED"] = "false"
+
+    records = list(read_records(args.log))
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print(f"No recorded requests found in {args.log}", file=sys.stderr)
+        return 1
+
+    with mock_watson(args.mock_latency_ms):
+        report = asyncio.run(replay(records, speed=args.speed, concurrency=args.concurrency))
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
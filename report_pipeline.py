@@ -0,0 +1,309 @@
+"""
+Bulk monthly report pipeline.
+
+Streams client records from a JSONL file and produces one monthly report per
+client combining the financial metrics, the budget summary and spending
+insights. LLM calls for many clients overlap under an asyncio concurrency
+limit, while charts and documents are rendered in a process pool. Each report
+is written as soon as it is ready and recorded in a checkpoint file, so an
+interrupted run resumes where it stopped.
+
+Each input line is a budget payload plus a ``client_id``:
+    {"client_id": "c-001", "income": 4000, "expenses": {...}, "savings_goal": 500,
+     "goals": [...], "currency_symbol": "$", "persona": "professional"}
+
+Usage:
+    python report_pipeline.py clients.jsonl reports/ --formats md,pdf --concurrency 16
+    python report_pipeline.py clients.jsonl reports/ --mock     # dry run with Watson mocked
+
+Charts and PDF output need matplotlib; requesting ``pdf`` without it fails at
+startup. A client is skipped on a later run only if its checkpointed outputs
+cover every requested format.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+CHECKPOINT_NAME = "checkpoint.jsonl"
+
+SUPPORTED_FORMATS = {"md", "pdf"}
+
+
+def iter_client_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream client records from a JSONL file"""
+    with open(path, encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "client_id" not in record:
+                raise ValueError(f"{path}:{line_number}: record has no client_id")
+            record["client_id"] = str(record["client_id"])
+            yield record
+
+
+def load_checkpoint(output_dir: str) -> Dict[str, Set[str]]:
+    """Formats already written per client id, from the checkpoint's recorded outputs"""
+    path = os.path.join(output_dir, CHECKPOINT_NAME)
+    completed: Dict[str, Set[str]] = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                    written = completed.setdefault(entry["client_id"], set())
+                except (ValueError, KeyError):
+                    # A torn last line from an interrupted run
+                    continue
+                for output in entry.get("outputs", []):
+                    written.add(os.path.splitext(output)[1].lstrip("."))
+    return completed
+
+
+def check_formats(formats: List[str]) -> None:
+    """Fail early on unknown formats, or on PDF output without matplotlib"""
+    unknown = set(formats) - SUPPORTED_FORMATS
+    if unknown:
+        raise ValueError(f"Unsupported report formats: {', '.join(sorted(unknown))}")
+    if "pdf" in formats:
+        try:
+            import matplotlib  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("PDF reports and charts need matplotlib (pip install matplotlib)") from e
+
+
+def _safe_name(client_id: str) -> str:
+    return "".join(char if char.isalnum() or char in "-_" else "_" for char in client_id)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as handle:
+        handle.write(data)
+    os.replace(temp_path, path)
+
+
+def _response_text(name: str, result: Any) -> str:
+    """Text of a generate_* result; an error result fails the client so a later run retries it"""
+    if isinstance(result, dict):
+        if result.get("error"):
+            raise RuntimeError(f"{name} failed: {result['error']}")
+        return str(result.get("response", ""))
+    return str(result)
+
+
+def build_markdown(record: Dict[str, Any], metrics: Dict[str, Any], summary: str, insights: str,
+                   month: str, chart_name: Optional[str] = None) -> str:
+    """Assemble the Markdown report for one client"""
+    currency = record.get("currency_symbol", "$")
+    expenses = record.get("expenses", {})
+    total = sum(expenses.values()) or 1
+
+    lines = [
+        f"# Monthly Financial Report - {month}",
+        "",
+        f"**Client:** {record['client_id']}  ",
+        f"**Profile:** {record.get('persona', 'general')}",
+        "",
+        "## Key Metrics",
+        "",
+        "| Metric | Value |",
+        "|---|---|",
+    ]
+    for name, value in metrics.items():
+        if isinstance(value, (int, float)):
+            lines.append(f"| {name.replace('_', ' ').title()} | {value:,.2f} |")
+
+    lines += ["", "## Expenses", ""]
+    if chart_name:
+        lines += [f"![Expenses by category]({chart_name})", ""]
+    lines += ["| Category | Amount | Share |", "|---|---|---|"]
+    for category, amount in sorted(expenses.items(), key=lambda item: item[1], reverse=True):
+        share = amount / total
+        bar = "#" * max(1, round(share * 20)) if amount else ""
+        lines.append(f"| {category} | {currency}{amount:,.2f} | {share:.0%} {bar} |")
+
+    goals = record.get("goals") or []
+    if goals:
+        lines += ["", "## Goals", "", "| Goal | Amount | Deadline (months) |", "|---|---|---|"]
+        for goal in goals:
+            lines.append(f"| {goal.get('name', '')} | {currency}{goal.get('amount', 0):,.2f} "
+                         f"| {goal.get('deadline_months', '')} |")
+
+    lines += ["", "## Budget Summary", "", summary, "", "## Spending Insights", "", insights, ""]
+    return "\n".join(lines)
+
+
+def render_client_report(record: Dict[str, Any], metrics: Dict[str, Any], summary: str, insights: str,
+                         output_dir: str, formats: List[str], month: str) -> List[str]:
+    """Render charts and documents for one client (runs in a worker process)"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_pdf import PdfPages
+    except ImportError:
+        plt = None
+
+    base = os.path.join(output_dir, _safe_name(record["client_id"]))
+    expenses = {name: amount for name, amount in record.get("expenses", {}).items() if amount > 0}
+    outputs = []
+
+    figure = None
+    chart_name = None
+    if plt is not None and expenses:
+        ordered = sorted(expenses.items(), key=lambda item: item[1])[-15:]
+        figure, axis = plt.subplots(figsize=(8, 5))
+        axis.barh([name for name, _ in ordered], [amount for _, amount in ordered], color="#667eea")
+        axis.set_title("Monthly expenses by category")
+        axis.set_xlabel(f"Amount ({record.get('currency_symbol', '$')})")
+        figure.tight_layout()
+        chart_path = f"{base}-expenses.png"
+        figure.savefig(f"{chart_path}.tmp", format="png", dpi=100)
+        os.replace(f"{chart_path}.tmp", chart_path)
+        chart_name = os.path.basename(chart_path)
+        outputs.append(chart_path)
+
+    markdown = build_markdown(record, metrics, summary, insights, month, chart_name)
+    if "md" in formats:
+        _write_atomic(f"{base}.md", markdown.encode("utf-8"))
+        outputs.append(f"{base}.md")
+
+    if "pdf" in formats and plt is not None:
+        pdf_path = f"{base}.pdf"
+        with PdfPages(f"{pdf_path}.tmp") as pdf:
+            if figure is not None:
+                pdf.savefig(figure)
+            wrapped = [wrapped_line for line in markdown.splitlines()
+                       for wrapped_line in (textwrap.wrap(line, 95) or [""])]
+            for start in range(0, len(wrapped), 60):
+                page = plt.figure(figsize=(8.27, 11.69))
+                page.text(0.05, 0.97, "\n".join(wrapped[start:start + 60]),
+                          va="top", family="monospace", fontsize=7)
+                pdf.savefig(page)
+                plt.close(page)
+        os.replace(f"{pdf_path}.tmp", pdf_path)
+        outputs.append(pdf_path)
+
+    if figure is not None:
+        plt.close(figure)
+    return outputs
+
+
+async def run_pipeline(
+    input_path: str,
+    output_dir: str,
+    formats: List[str],
+    concurrency: int = 8,
+    render_workers: Optional[int] = None,
+    month: Optional[str] = None,
+) -> Dict[str, int]:
+    """Generate reports for every client not yet in the checkpoint"""
+    check_formats(formats)
+
+    from app import ibm_api
+    from app.utils import calculate_financial_metrics
+
+    os.makedirs(output_dir, exist_ok=True)
+    month = month or datetime.now().strftime("%B %Y")
+    completed = load_checkpoint(output_dir)
+    stats = {"rendered": 0, "skipped": 0, "failed": 0}
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency * 2))
+    queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=concurrency * 2)
+
+    with ProcessPoolExecutor(render_workers) as pool, \
+            open(os.path.join(output_dir, CHECKPOINT_NAME), "a", encoding="utf-8") as checkpoint:
+
+        async def worker() -> None:
+            while True:
+                record = await queue.get()
+                if record is None:
+                    return
+                client_id = record["client_id"]
+                try:
+                    summary, insights = await asyncio.gather(
+                        asyncio.to_thread(ibm_api.generate_budget_summary, record),
+                        asyncio.to_thread(ibm_api.generate_spending_insights, record),
+                    )
+                    summary_text = _response_text("Budget summary", summary)
+                    insights_text = _response_text("Spending insights", insights)
+                    metrics = calculate_financial_metrics(record)
+                    outputs = await loop.run_in_executor(
+                        pool, render_client_report, record, metrics, summary_text,
+                        insights_text, output_dir, formats, month,
+                    )
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"Report for client {client_id} failed: {e}", file=sys.stderr)
+                    continue
+
+                checkpoint.write(json.dumps({"client_id": client_id, "outputs": outputs}) + "\n")
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+                stats["rendered"] += 1
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        queued: Set[str] = set()
+        for record in iter_client_records(input_path):
+            client_id = record["client_id"]
+            if set(formats) <= completed.get(client_id, set()) or client_id in queued:
+                stats["skipped"] += 1
+                continue
+            queued.add(client_id)
+            await queue.put(record)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Render monthly reports for a whole client book")
+    parser.add_argument("input", help="JSONL file of client budget records")
+    parser.add_argument("output_dir", help="Directory for reports and the checkpoint")
+    parser.add_argument("--formats", default="md,pdf", help="Comma-separated output formats (md, pdf)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clients with LLM calls in flight")
+    parser.add_argument("--render-workers", type=int, default=None, help="Rendering processes")
+    parser.add_argument("--month", help="Report period label (default: current month)")
+    parser.add_argument("--mock", action="store_true", help="Mock IBM Watson calls for a dry run")
+    args = parser.parse_args(argv)
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    try:
+        check_formats(formats)
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if args.mock:
+        from replay import mock_watson
+        context = mock_watson()
+    else:
+        context = nullcontext()
+
+    start = time.perf_counter()
+    with context:
+        stats = asyncio.run(run_pipeline(
+            args.input, args.output_dir, formats, args.concurrency, args.render_workers, args.month
+        ))
+
+    print(f"Rendered {stats['rendered']}, skipped {stats['skipped']} already done, "
+          f"failed {stats['failed']} in {time.perf_counter() - start:.1f}s")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
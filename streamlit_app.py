@@ -386,6 +386,20 @@ def show_budget_summary_page():
         
         st.markdown('</div>', unsafe_allow_html=True)
 
+def show_anomaly_alerts(anomalies):
+    """Display spending anomaly alerts returned with spending insights"""
+    st.markdown("### 🚨 Spending Alerts")
+    for anomaly in anomalies:
+        message = (
+            f"**{anomaly.get('category', 'Unknown')}**: ₹{anomaly.get('amount', 0):,.2f} "
+            f"vs usual ₹{anomaly.get('expected', 0):,.2f} "
+            f"({anomaly.get('z_score', 0):.1f} std devs above normal)"
+        )
+        if anomaly.get("severity") == "high":
+            st.error(message)
+        else:
+            st.warning(message)
+
 def show_spending_insights_page():
     """Display Spending Insights page"""
     st.markdown('<div class="frosted-glass">', unsafe_allow_html=True)
@@ -469,6 +483,10 @@ def show_spending_insights_page():
             data = st.session_state.insights_result.get("data", {})
             insights = data.get("insights", "")
             
+            anomalies = data.get("anomalies", [])
+            if anomalies:
+                show_anomaly_alerts(anomalies)
+            
             st.markdown('<div class="json-output">', unsafe_allow_html=True)
             st.text(insights)
             st.markdown('</div>', unsafe_allow_html=True)
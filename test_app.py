@@ -185,5 +185,569 @@ class TestUtils:
         # Should contain professional-specific language
         assert "strategic" in prompt.lower() or "professional" in prompt.lower()
 
+class TestRequestRecorder:
+    """Test suite for traffic recording and replay helpers"""
+    
+    def test_sanitize_payload(self):
+        """Test that sensitive values are redacted before logging"""
+        from app.recorder import sanitize_payload
+        
+        payload = sanitize_payload({
+            "question": "Email me at jane@example.com about card 4111 1111 1111 1111",
+            "api_key": "secret",
+            "expenses": {"rent": 1000}
+        })
+        
+        assert payload["api_key"] == "[REDACTED]"
+        assert "jane@example.com" not in payload["question"]
+        assert "4111" not in payload["question"]
+        assert payload["expenses"] == {"rent": 1000}
+    
+    def test_recorder_rotation_and_read_back(self, tmp_path):
+        """Test that recorded requests survive rotation and read back in order"""
+        from app.recorder import RequestRecorder, read_records
+        
+        for i in range(3):
+            recorder = RequestRecorder(log_dir=str(tmp_path), max_bytes=1, backup_count=5)
+            recorder.submit({"ts": i, "path": "/api/v1/nlu", "payload": {"text": "x" * 150}})
+            recorder.close()
+        
+        records = list(read_records(str(tmp_path)))
+        assert [record["ts"] for record in records] == [0, 1, 2]
+        assert len(list(tmp_path.glob("requests-*.jsonl.gz"))) == 3
+    
+    def test_recorder_uses_one_log_per_worker(self, tmp_path):
+        """Test that each worker process appends to its own log and all logs are read back"""
+        import os
+        from app.recorder import RequestRecorder, read_records
+        
+        recorder = RequestRecorder(log_dir=str(tmp_path))
+        recorder.submit({"ts": 1, "path": "/api/v1/nlu", "payload": None})
+        recorder.close()
+        with patch("os.getpid", return_value=os.getpid() + 1):
+            other = RequestRecorder(log_dir=str(tmp_path))
+            other.submit({"ts": 2, "path": "/api/v1/generate", "payload": None})
+            other.close()
+        
+        assert len(list(tmp_path.glob("requests.*.jsonl.gz"))) == 2
+        assert sorted(record["ts"] for record in read_records(str(tmp_path))) == [1, 2]
+    
+    def test_recorded_api_request(self, tmp_path):
+        """Test that the middleware records API calls with timing"""
+        from app.recorder import RequestRecorder, RequestRecorderMiddleware, read_records
+        
+        recorder = RequestRecorder(log_dir=str(tmp_path))
+        recording_client = TestClient(RequestRecorderMiddleware(app, recorder=recorder))
+        recording_client.get("/")
+        recording_client.post("/api/v1/nlu", json={"invalid_field": "test"})
+        recorder.close()
+        
+        records = list(read_records(str(tmp_path)))
+        assert len(records) == 1
+        assert records[0]["path"] == "/api/v1/nlu"
+        assert records[0]["status"] == 422
+        assert records[0]["duration_ms"] >= 0
+    
+    def test_summarize_latencies(self):
+        """Test latency distribution summary used by the replay report"""
+        from replay import summarize_latencies
+        
+        summary = summarize_latencies([float(i) for i in range(1, 101)])
+        
+        assert summary["count"] == 100
+        assert summary["p50"] == 50.5
+        assert summary["max"] == 100.0
+
+class TestModelRouter:
+    """Test suite for latency-aware model routing"""
+    
+    def test_simple_question_uses_small_model(self):
+        """Test that trivial questions go to the small tier"""
+        from app.model_router import ModelRouter, SMALL_TIER
+        
+        router = ModelRouter(small_model_id="small-model", large_model_id="large-model")
+        decision = router.route("generate", "What is an emergency fund?", "student", ["emergency fund"])
+        
+        assert decision.tier == SMALL_TIER
+        assert decision.model_id == "small-model"
+    
+    def test_complex_question_uses_large_model(self):
+        """Test that multi-topic questions and analysis endpoints go to the large tier"""
+        from app.model_router import ModelRouter, LARGE_TIER
+        
+        router = ModelRouter(small_model_id="small-model", large_model_id="large-model")
+        question = "Should I pay off my student loans first or invest in a Roth IRA for retirement?"
+        
+        assert router.route("generate", question, "professional").tier == LARGE_TIER
+        assert router.route("budget-summary").model_id == "large-model"
+    
+    def test_slo_breach_tightens_token_budget(self):
+        """Test that slow upstream latency shrinks and then restores max_new_tokens"""
+        from app.model_router import ModelRouter
+        
+        router = ModelRouter(slos_ms={"generate": 1000.0})
+        baseline = router.route("generate", "What is a budget?").max_new_tokens
+        
+        for _ in range(10):
+            router.record_latency("generate", 3000.0)
+        tightened = router.route("generate", "What is a budget?").max_new_tokens
+        
+        for _ in range(50):
+            router.record_latency("generate", 200.0)
+        restored = router.route("generate", "What is a budget?").max_new_tokens
+        
+        assert tightened < baseline
+        assert restored == baseline
+    
+    def test_single_latency_spike_does_not_tighten(self):
+        """Test that one slow response among healthy ones leaves the budget alone"""
+        from app.model_router import ModelRouter
+        
+        router = ModelRouter(slos_ms={"generate": 1000.0})
+        baseline = router.route("generate", "What is a budget?").max_new_tokens
+        
+        for _ in range(10):
+            router.record_latency("generate", 300.0)
+        router.record_latency("generate", 4000.0)
+        
+        assert router.budget_scale("generate") == 1.0
+        assert router.route("generate", "What is a budget?").max_new_tokens == baseline
+
+class TestBenchmarks:
+    """Test suite for the performance regression benchmark helpers"""
+    
+    def test_payload_generator_sizes(self):
+        """Test that generated payloads are deterministic and sized as requested"""
+        from benchmark import make_budget_payload
+        
+        payload = make_budget_payload("large")
+        
+        assert len(payload["expenses"]) == 200
+        assert len(payload["goals"]) == 25
+        assert payload == make_budget_payload("large")
+    
+    def test_model_payloads_cover_text_models(self):
+        """Test that NLU and Q&A request models get text payloads rather than being skipped"""
+        from pydantic import BaseModel
+        from benchmark import _model_payload
+        
+        class TextRequest(BaseModel):
+            text: str
+        
+        class QuestionRequest(BaseModel):
+            question: str
+            persona: str = "general"
+        
+        assert set(_model_payload(TextRequest, "large")) == {"text"}
+        assert set(_model_payload(QuestionRequest, "small")) == {"question", "persona"}
+        assert len(_model_payload(TextRequest, "xlarge")["text"].split()) == 4000
+    
+    def test_compare_runs_flags_regression(self):
+        """Test that a consistent slowdown is flagged and noise is not"""
+        from benchmark import compare_runs
+        
+        baseline = {"benchmarks": {
+            "slow": {"median_us": 100.0, "samples_us": [100.0 + i % 3 for i in range(20)]},
+            "same": {"median_us": 50.0, "samples_us": [50.0 + i % 3 for i in range(20)]},
+        }}
+        candidate = {"benchmarks": {
+            "slow": {"median_us": 130.0, "samples_us": [130.0 + i % 3 for i in range(20)]},
+            "same": {"median_us": 50.0, "samples_us": [50.0 + (i + 1) % 3 for i in range(20)]},
+        }}
+        
+        status = {row["name"]: row["status"] for row in compare_runs(baseline, candidate)}
+        
+        assert status == {"slow": "regression", "same": "unchanged"}
+
+class TestBudgetLedger:
+    """Test suite for the incremental budget ledger"""
+    
+    def test_ledger_matches_financial_metrics(self):
+        """Test that incremental aggregates match the full recomputation"""
+        from app.ledger import BudgetLedger
+        
+        ledger = BudgetLedger(income=3000, savings_goal=500)
+        ledger.add_entry("e1", "rent", 1000)
+        ledger.add_entry("e2", "food", 250, member="alex")
+        ledger.add_entry("e3", "food", 150, member="sam")
+        ledger.add_entry("e4", "transportation", 200)
+        ledger.add_entry("e5", "shopping", 75.5)
+        ledger.remove_entry("e5")
+        
+        metrics = ledger.metrics()
+        
+        assert metrics["annual_income"] == 36000
+        assert metrics["total_monthly_expenses"] == 1600
+        assert metrics["disposable_income"] == 1400
+        assert metrics["surplus_after_savings"] == 900
+        assert ledger.budget_data()["expenses"] == {"rent": 1000, "food": 400, "transportation": 200}
+        assert ledger.member_total("alex") == 250
+    
+    def test_ledger_update_moves_totals(self):
+        """Test that editing an entry moves it between categories and members"""
+        from app.ledger import BudgetLedger
+        
+        ledger = BudgetLedger(income=2000)
+        ledger.add_entry("e1", "rent", 900)
+        ledger.add_entry("e2", "food", 300, member="alex")
+        ledger.update_entry("e2", amount=1200, category="travel", member="sam")
+        
+        assert ledger.category_total("food") == 0
+        assert ledger.member_category_total("sam", "travel") == 1200
+        assert ledger.largest_category() == ("travel", 1200)
+        assert ledger.category_ratio("travel") == 0.6
+    
+    def test_ledger_store_persists_journal(self, tmp_path):
+        """Test that ledgers reload from the journal and after compaction"""
+        from app.ledger import LedgerStore
+        
+        store = LedgerStore(str(tmp_path))
+        store.set_income("user-1", 3000)
+        store.add_entry("user-1", "e1", "rent", 1000)
+        store.add_entry("user-1", "e2", "food", 400)
+        store.update_entry("user-1", "e2", amount=350)
+        expected = store.get("user-1").metrics()
+        
+        assert LedgerStore(str(tmp_path)).get("user-1").metrics() == expected
+        store.compact("user-1")
+        assert LedgerStore(str(tmp_path)).get("user-1").metrics() == expected
+    
+    def test_ledger_store_cache_is_bounded(self, tmp_path):
+        """Test that evicted ledgers are reloaded from their journal"""
+        from app.ledger import LedgerStore
+        
+        store = LedgerStore(str(tmp_path), max_cached_users=2)
+        for i in range(5):
+            store.set_income(f"user-{i}", 1000 * (i + 1))
+        
+        assert len(store._ledgers) == 2
+        assert store.get("user-0").income == 1000
+    
+    def test_ledger_store_failed_append_reloads_from_disk(self, tmp_path):
+        """Test that a failed journal write does not leave memory ahead of disk"""
+        from app.ledger import LedgerStore
+        
+        store = LedgerStore(str(tmp_path))
+        store.set_income("user-1", 3000)
+        store.add_entry("user-1", "e1", "rent", 1000)
+        
+        with patch("builtins.open", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                store.add_entry("user-1", "e2", "food", 400)
+        
+        assert store.get("user-1").total_expenses == 1000
+    
+    def test_ledger_store_recovers_from_torn_write(self, tmp_path):
+        """Test that operations appended after a torn journal line survive a reload"""
+        from app.ledger import LedgerStore
+        
+        store = LedgerStore(str(tmp_path))
+        store.add_entry("user-1", "e1", "rent", 1000)
+        with open(tmp_path / "user-1.jsonl", "a", encoding="utf-8") as handle:
+            handle.write('{"op":"add","id":"e2","cate')
+        store.add_entry("user-1", "e3", "food", 200)
+        store.update_entry("user-1", "e3", amount=250)
+        
+        ledger = LedgerStore(str(tmp_path)).get("user-1")
+        
+        assert ledger.budget_data()["expenses"] == {"rent": 1000, "food": 250}
+    
+    def test_ledger_store_sees_other_workers(self, tmp_path):
+        """Test that a store picks up journal lines written by another process before validating"""
+        from app.ledger import LedgerStore
+        
+        first, second = LedgerStore(str(tmp_path)), LedgerStore(str(tmp_path))
+        first.set_income("user-1", 3000)
+        assert second.get("user-1").income == 3000
+        
+        first.add_entry("user-1", "e1", "rent", 1000)
+        with pytest.raises(ValueError):
+            second.add_entry("user-1", "e1", "rent", 1000)
+        second.add_entry("user-1", "e2", "food", 300)
+        
+        assert first.get("user-1").total_expenses == 1300
+        assert LedgerStore(str(tmp_path)).get("user-1").total_expenses == 1300
+    
+    def test_ledger_store_skips_bad_operations_on_load(self, tmp_path):
+        """Test that one unusable journal operation does not make the ledger unreadable"""
+        from app.ledger import LedgerStore
+        
+        (tmp_path / "user-1.jsonl").write_text("\n".join([
+            '{"op":"add","id":"e1","category":"rent","amount":1000}',
+            '{"op":"add","id":"e1","category":"rent","amount":1000}',
+            '{"op":"update","id":"missing","amount":5}',
+            '{"op":"add","id":"e2","category":"food","amount":200}',
+        ]) + "\n")
+        
+        assert LedgerStore(str(tmp_path)).get("user-1").total_expenses == 1200
+
+class TestReportPipeline:
+    """Test suite for the bulk report pipeline"""
+    
+    def test_build_markdown(self):
+        """Test that the Markdown report combines metrics, expenses and LLM sections"""
+        from report_pipeline import build_markdown
+        
+        record = {
+            "client_id": "c-001",
+            "income": 3000,
+            "expenses": {"rent": 1000, "food": 400},
+            "goals": [{"name": "Emergency Fund", "amount": 10000, "deadline_months": 12}],
+            "currency_symbol": "$"
+        }
+        
+        report = build_markdown(record, {"annual_income": 36000}, "Summary text", "Insights text", "May 2025")
+        
+        assert "# Monthly Financial Report - May 2025" in report
+        assert "| rent | $1,000.00 |" in report
+        assert "Emergency Fund" in report
+        assert "Summary text" in report and "Insights text" in report
+    
+    @patch('app.ibm_api.generate_spending_insights')
+    @patch('app.ibm_api.generate_budget_summary')
+    def test_pipeline_resumes_from_checkpoint(self, mock_summary, mock_insights, tmp_path):
+        """Test that a second run skips clients already in the checkpoint and retries failed ones"""
+        import asyncio
+        from report_pipeline import run_pipeline
+        
+        outage = {"c-1"}
+        
+        def summary(record):
+            if record["client_id"] in outage:
+                outage.discard(record["client_id"])
+                return {"response": None, "error": "rate limited"}
+            return {"response": "Budget summary...", "error": None}
+        
+        mock_summary.side_effect = summary
+        mock_insights.return_value = {"response": "Spending insights...", "error": None}
+        
+        input_path = tmp_path / "clients.jsonl"
+        input_path.write_text("\n".join(
+            json.dumps({"client_id": f"c-{i}", "income": 3000, "expenses": {"rent": 1000}, "savings_goal": 500})
+            for i in range(3)
+        ))
+        output_dir = str(tmp_path / "reports")
+        
+        first = asyncio.run(run_pipeline(str(input_path), output_dir, ["md"], concurrency=2, render_workers=1))
+        
+        assert first == {"rendered": 2, "skipped": 0, "failed": 1}
+        assert not (tmp_path / "reports" / "c-1.md").exists()
+        
+        second = asyncio.run(run_pipeline(str(input_path), output_dir, ["md"], concurrency=2, render_workers=1))
+        
+        assert second == {"rendered": 1, "skipped": 2, "failed": 0}
+        assert "Budget summary..." in (tmp_path / "reports" / "c-1.md").read_text()
+    
+    def test_checkpoint_skips_only_covered_formats(self, tmp_path):
+        """Test that clients checkpointed without PDF output are re-rendered when PDF is requested"""
+        from report_pipeline import CHECKPOINT_NAME, load_checkpoint
+        
+        (tmp_path / CHECKPOINT_NAME).write_text("\n".join([
+            json.dumps({"client_id": "c-0", "outputs": ["reports/c-0.md"]}),
+            json.dumps({"client_id": "c-1", "outputs": ["reports/c-1-expenses.png", "reports/c-1.md", "reports/c-1.pdf"]}),
+            '{"client_id": "c-2", "outp'
+        ]))
+        
+        completed = load_checkpoint(str(tmp_path))
+        
+        assert {"md", "pdf"} <= completed["c-1"]
+        assert not {"md", "pdf"} <= completed["c-0"]
+        assert "c-2" not in completed
+    
+    def test_unsupported_format_fails_early(self):
+        """Test that unknown formats are rejected before any client is processed"""
+        from report_pipeline import check_formats
+        
+        with pytest.raises(ValueError):
+            check_formats(["md", "docx"])
+
+class TestAnomalyDetector:
+    """Test suite for streaming spending anomaly detection"""
+    
+    def test_spike_is_flagged(self):
+        """Test that a spike well above a category's history is flagged"""
+        from app.anomaly import SpendingAnomalyDetector
+        
+        detector = SpendingAnomalyDetector()
+        for month in range(6):
+            assert detector.observe_expenses("user-1", {"food": 400 + month * 5, "rent": 1000}) == []
+        
+        flags = detector.observe_expenses("user-1", {"food": 900, "rent": 1010})
+        
+        assert [flag.category for flag in flags] == ["food"]
+        assert flags[0].severity == "high"
+        assert detector.recent_flags("user-1") == flags
+    
+    def test_no_flags_without_history(self):
+        """Test that early observations and other users are never flagged"""
+        from app.anomaly import SpendingAnomalyDetector
+        
+        detector = SpendingAnomalyDetector(min_observations=4)
+        flags = [detector.observe("user-1", "travel", amount) for amount in (100, 5000, 50, 9000)]
+        
+        assert flags == [None, None, None, None]
+        assert detector.recent_flags("user-2") == []
+    
+    def test_small_change_from_zero_history(self):
+        """Test that a tiny amount after a history of zeros is not flagged with a huge z-score"""
+        from app.anomaly import SpendingAnomalyDetector
+        
+        detector = SpendingAnomalyDetector()
+        for month in range(6):
+            assert detector.observe("user-1", "subscriptions", 0) is None
+        
+        assert detector.observe("user-1", "subscriptions", 1) is None
+        flag = detector.observe("user-1", "subscriptions", 250)
+        assert flag is not None and flag.z_score < 1000
+    
+    def test_prompt_fields(self):
+        """Test structured and prompt-ready anomaly output"""
+        from app.anomaly import AnomalyFlag, anomaly_fields, format_anomalies_for_prompt
+        
+        flags = [AnomalyFlag("dining_out", 600.0, 200.0, 8.5, "high", 0.0)]
+        
+        assert anomaly_fields(flags)[0]["category"] == "dining_out"
+        assert "dining_out: $600.00 vs typical $200.00" in format_anomalies_for_prompt(flags)
+        assert "No unusual spending" in format_anomalies_for_prompt([])
+
+class TestIAMTokenManager:
+    """Test suite for cached IAM token management against a local fake IAM endpoint"""
+    
+    @staticmethod
+    def start_fake_iam(expires_in=3600):
+        """Start a local IAM token endpoint; returns (server, url, list of requested api keys)"""
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from urllib.parse import parse_qs
+        
+        requested = []
+        
+        class FakeIAMHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+                requested.append(form["apikey"][0])
+                if form["apikey"][0] == "invalid-key":
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                body = json.dumps({
+                    "access_token": f"token-{len(requested)}",
+                    "expires_in": expires_in,
+                    "expiration": time.time() + expires_in
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        server = HTTPServer(("127.0.0.1", 0), FakeIAMHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f"http://127.0.0.1:{server.server_port}/identity/token", requested
+    
+    def test_token_cached_per_key(self, tmp_path):
+        """Test that repeated lookups reuse the cached token"""
+        from app.iam_token import IAMTokenManager
+        
+        server, url, requested = self.start_fake_iam()
+        try:
+            manager = IAMTokenManager(iam_url=url, cache_dir=str(tmp_path))
+            
+            assert manager.get_token("nlu-key") == manager.get_token("nlu-key")
+            assert manager.get_token("watsonx-key") != manager.get_token("nlu-key")
+            assert requested == ["nlu-key", "watsonx-key"]
+        finally:
+            server.shutdown()
+    
+    def test_token_shared_across_workers(self, tmp_path):
+        """Test that a second worker adopts the token from the shared file cache"""
+        from app.iam_token import IAMTokenManager
+        
+        server, url, requested = self.start_fake_iam()
+        try:
+            first = IAMTokenManager(iam_url=url, cache_dir=str(tmp_path))
+            second = IAMTokenManager(iam_url=url, cache_dir=str(tmp_path))
+            
+            token = first.get_token("nlu-key")
+            
+            assert second.get_token("nlu-key") == token
+            assert len(requested) == 1
+            assert list(second.metrics().values())[0]["blocking_fetches"] == 0
+        finally:
+            server.shutdown()
+    
+    def test_shared_cache_needs_private_directory(self, tmp_path):
+        """Test that a cache directory other users can access is not used for shared tokens"""
+        import os
+        from app.iam_token import IAMTokenManager
+        
+        cache_dir = tmp_path / "iam"
+        cache_dir.mkdir(mode=0o755)
+        os.chmod(cache_dir, 0o755)
+        server, url, requested = self.start_fake_iam()
+        try:
+            first = IAMTokenManager(iam_url=url, cache_dir=str(cache_dir))
+            second = IAMTokenManager(iam_url=url, cache_dir=str(cache_dir))
+            
+            first.get_token("nlu-key")
+            second.get_token("nlu-key")
+            
+            assert not first.shared_cache_enabled
+            assert len(requested) == 2
+            assert os.listdir(cache_dir) == []
+        finally:
+            server.shutdown()
+    
+    def test_background_refresh(self, tmp_path):
+        """Test that refreshes prefetch and replace tokens so callers never block, and failures are recorded"""
+        from app.iam_token import IAMTokenManager
+        
+        server, url, requested = self.start_fake_iam()
+        try:
+            manager = IAMTokenManager(iam_url=url, cache_dir=str(tmp_path))
+            valid, invalid = manager._state("nlu-key"), manager._state("invalid-key")
+            
+            manager._refresh(valid)
+            first = manager.get_token("nlu-key")
+            manager._refresh(valid)
+            manager._refresh(invalid)
+            
+            assert manager.get_token("nlu-key") != first
+            assert (valid.refreshes, valid.blocking_fetches) == (2, 0)
+            assert valid.refresh_at > valid.token.fetched_at
+            assert invalid.token is None and invalid.failures == 1 and invalid.last_error
+            assert requested == ["nlu-key", "nlu-key", "invalid-key"]
+        finally:
+            server.shutdown()
+    
+    def test_refresh_survives_missing_cache_dir_and_bad_cache_file(self, tmp_path):
+        """Test that a removed cache directory or a corrupt cache file does not break refreshes"""
+        import shutil
+        from app.iam_token import IAMTokenManager
+        
+        cache_dir = tmp_path / "iam"
+        server, url, requested = self.start_fake_iam()
+        try:
+            manager = IAMTokenManager(iam_url=url, cache_dir=str(cache_dir))
+            state = manager._state("nlu-key")
+            shutil.rmtree(cache_dir)
+            
+            manager._refresh(state)
+            
+            assert state.refreshes == 1 and manager.shared_cache_enabled
+            assert (cache_dir / f"iam-{state.key_id}.json").exists()
+            
+            (cache_dir / f"iam-{state.key_id}.json").write_text(
+                json.dumps({"access_token": "bad", "expiration": "soon", "fetched_at": 0})
+            )
+            manager._refresh(state)
+            
+            assert state.refreshes == 2 and state.failures == 0
+        finally:
+            server.shutdown()
+
 if __name__ == "__main__":
     pytest.main([__file__])